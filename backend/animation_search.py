@@ -0,0 +1,216 @@
+"""In-memory search index over animation names and tags.
+
+Text is casefolded, NFKD-normalized and stripped of diacritics (with ø/æ/å folded), so
+"Bølge", "bølge" and "bolge" index and query identically. Documents only need ``id``,
+``name``, ``tags`` and ``created_at`` attributes.
+"""
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+import bisect
+import heapq
+import itertools
+import re
+import unicodedata
+
+# Letters that NFKD does not decompose but users commonly type without the diacritic.
+_TEXT_FOLD = str.maketrans({"ø": "o", "æ": "ae", "å": "a", "ß": "ss", "œ": "oe", "ł": "l", "đ": "d"})
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold().translate(_TEXT_FOLD))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+def trigrams(token: str) -> set:
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AnimationSearchIndex:
+    """Token index over animation names and tags with prefix and trigram (typo-tolerant) matching.
+
+    Fuzzy matching runs against the token vocabulary rather than the documents, so its cost
+    grows with the number of distinct words, not the number of animations. Each token also
+    keeps its documents ordered by recency per field weight, so a single-word query reads its
+    first page straight off those lists instead of scoring every match.
+    """
+
+    NAME_WEIGHT = 1.0
+    TAG_WEIGHT = 0.8
+    PREFIX_LIMIT = 64
+    FUZZY_MIN_LENGTH = 3
+    FUZZY_THRESHOLD = 0.5
+
+    def __init__(self):
+        self._docs = {}
+        self._doc_tokens = {}
+        self._postings = {}
+        self._ranked = {}
+        self._tag_docs = defaultdict(set)
+        self._grams = defaultdict(set)
+        self._vocab = []
+
+    def __len__(self):
+        return len(self._docs)
+
+    def get(self, anim_id: str):
+        return self._docs.get(anim_id)
+
+    def all(self) -> list:
+        return list(self._docs.values())
+
+    def add(self, anim):
+        if anim.id in self._docs:
+            self.remove(anim.id)
+        tokens = {}
+        for tag in anim.tags:
+            for token in tokenize(tag):
+                tokens[token] = self.TAG_WEIGHT
+        for token in tokenize(anim.name):
+            tokens[token] = self.NAME_WEIGHT
+        key = (anim.created_at, anim.id)
+        for token, weight in tokens.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                self._ranked[token] = {}
+                bisect.insort(self._vocab, token)
+                for gram in trigrams(token):
+                    self._grams[gram].add(token)
+            self._postings[token][anim.id] = weight
+            bisect.insort(self._ranked[token].setdefault(weight, []), key)
+        for tag in anim.tags:
+            self._tag_docs[tag].add(anim.id)
+        self._docs[anim.id] = anim
+        self._doc_tokens[anim.id] = tokens
+
+    def remove(self, anim_id: str):
+        anim = self._docs.pop(anim_id, None)
+        if anim is None:
+            return
+        for tag in anim.tags:
+            self._tag_docs[tag].discard(anim_id)
+            if not self._tag_docs[tag]:
+                del self._tag_docs[tag]
+        key = (anim.created_at, anim_id)
+        for token, weight in self._doc_tokens.pop(anim_id).items():
+            ranked = self._ranked[token][weight]
+            del ranked[bisect.bisect_left(ranked, key)]
+            if not ranked:
+                del self._ranked[token][weight]
+            posting = self._postings[token]
+            posting.pop(anim_id, None)
+            if posting:
+                continue
+            del self._postings[token]
+            del self._ranked[token]
+            del self._vocab[bisect.bisect_left(self._vocab, token)]
+            for gram in trigrams(token):
+                self._grams[gram].discard(token)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+
+    def _match_token(self, query: str) -> dict:
+        """Vocabulary tokens matching one query token, mapped to a match score in (0, 1]."""
+        matches = {}
+        if query in self._postings:
+            matches[query] = 1.0
+        i = bisect.bisect_left(self._vocab, query)
+        end = min(len(self._vocab), i + self.PREFIX_LIMIT)
+        while i < end and self._vocab[i].startswith(query):
+            token = self._vocab[i]
+            matches.setdefault(token, 0.6 + 0.3 * len(query) / len(token))
+            i += 1
+        if len(query) >= self.FUZZY_MIN_LENGTH:
+            query_grams = trigrams(query)
+            shared = defaultdict(int)
+            for gram in query_grams:
+                for token in self._grams.get(gram, ()):
+                    shared[token] += 1
+            for token, count in shared.items():
+                similarity = 2 * count / (len(query_grams) + len(token))
+                if similarity >= self.FUZZY_THRESHOLD and token not in matches:
+                    matches[token] = 0.5 * similarity
+        return matches
+
+    def _match(self, query: str, tags: Optional[List[str]]):
+        """Per-query-token matches and the set of matching ids; every query token must match."""
+        token_matches = [self._match_token(q) for q in dict.fromkeys(tokenize(query))]
+        if not token_matches or not all(token_matches):
+            return token_matches, ()
+        ids = None
+        for matches in token_matches:
+            if len(matches) == 1:
+                candidates = self._postings[next(iter(matches))].keys()
+            else:
+                candidates = set().union(*(self._postings[t].keys() for t in matches))
+            ids = candidates if ids is None else ids & candidates
+        for tag in tags or ():
+            ids &= self._tag_docs.get(tag, set())
+        return token_matches, ids
+
+    def _scorer(self, matches: dict):
+        """Score function of one query token for ids known to match it."""
+        if len(matches) == 1:
+            (token, score), = matches.items()
+            posting = self._postings[token]
+            return lambda anim_id: score * posting[anim_id]
+        doc_tokens = self._doc_tokens
+        return lambda anim_id: max(matches.get(t, 0.0) * w for t, w in doc_tokens[anim_id].items())
+
+    def _ranked_ids(self, matches: dict, ids):
+        """Ids from `ids` in (score, recency) order for a single query token, lazily."""
+        by_score = defaultdict(list)
+        for token, score in matches.items():
+            for weight, ranked in self._ranked[token].items():
+                by_score[score * weight].append(reversed(ranked))
+        seen = set()
+        for score in sorted(by_score, reverse=True):
+            for _, anim_id in heapq.merge(*by_score[score], reverse=True):
+                if anim_id in ids and anim_id not in seen:
+                    seen.add(anim_id)
+                    yield anim_id
+
+    def matches(self, query: str, tags: Optional[List[str]] = None) -> list:
+        """All matching documents, unordered."""
+        return [self._docs[i] for i in self.match_ids(query, tags)]
+
+    def match_ids(self, query: str, tags: Optional[List[str]] = None):
+        """Ids of all matching documents, unordered."""
+        return self._match(query, tags)[1]
+
+    def tag_ids(self, tags: List[str]) -> set:
+        """Ids of documents carrying every one of `tags` (exact tag strings)."""
+        sets = sorted((self._tag_docs.get(tag, set()) for tag in tags), key=len)
+        return set(sets[0]).intersection(*sets[1:]) if sets else set(self._docs)
+
+    def tag_counts(self, ids) -> Counter:
+        """Per-tag document counts restricted to `ids`, computed with set intersections."""
+        ids = ids if isinstance(ids, (set, frozenset)) else set(ids)
+        counts = Counter()
+        for tag, tagged in self._tag_docs.items():
+            count = len(ids & tagged)
+            if count:
+                counts[tag] = count
+        return counts
+
+    def search(self, query: str, tags: Optional[List[str]] = None, limit: int = 20, offset: int = 0) -> Tuple[list, int]:
+        """One page of matches ranked by score, then recency, plus the total match count.
+
+        Only offset + limit documents are ranked, so large result sets are never sorted in full.
+        """
+        token_matches, ids = self._match(query, tags)
+        if not ids:
+            return [], 0
+        count = offset + limit
+        if len(token_matches) == 1:
+            top = list(itertools.islice(self._ranked_ids(token_matches[0], ids), count))
+        else:
+            docs = self._docs
+            scorers = [self._scorer(matches) for matches in token_matches]
+            top = heapq.nlargest(count, ids, key=lambda i: (sum(f(i) for f in scorers), docs[i].created_at))
+        return [self._docs[i] for i in top[offset:]], len(ids)
@@ -0,0 +1,76 @@
+"""Compare JSON frame animations with their NVF encoding (size and parse time).
+
+    python bench_frame_format.py [--width 64] [--height 64] [--frames 60] [--colors 12]
+"""
+import argparse
+import io
+import json
+import random
+import time
+
+import frame_format
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def synthetic_animation(width: int, height: int, frames: int, colors: int) -> bytes:
+    rng = random.Random(2608)
+    palette = ["#%06x" % rng.randrange(1 << 24) for _ in range(colors)]
+    doc = {
+        "width": width,
+        "height": height,
+        "frames": [
+            {"delay": 100, "pixels": [palette[(x + y + i) % colors] for y in range(height) for x in range(width)]}
+            for i in range(frames)
+        ],
+    }
+    return json.dumps(doc).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=64)
+    parser.add_argument("--height", type=int, default=64)
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--colors", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw_json = synthetic_animation(args.width, args.height, args.frames, args.colors)
+    start = time.perf_counter()
+    width, height, frames = frame_format.read_json_frames(io.BytesIO(raw_json))
+    nvf = frame_format.encode(width, height, frames)
+    convert_s = time.perf_counter() - start
+
+    def parse_json():
+        json.loads(raw_json)
+
+    def parse_nvf():
+        frame_format.decode(nvf)
+
+    def parse_nvf_rgb():
+        anim = frame_format.decode(nvf)
+        for i in range(anim.frame_count):
+            anim.frame_rgb(i)
+
+    json_s = best_of(parse_json, args.repeat)
+    nvf_s = best_of(parse_nvf, args.repeat)
+    nvf_rgb_s = best_of(parse_nvf_rgb, args.repeat)
+
+    print(f"{args.width}x{args.height}, {args.frames} frames, {args.colors} colours "
+          f"(streaming parser: {'ijson' if frame_format.ijson else 'json fallback'})")
+    print(f"  size     JSON {len(raw_json):>10,} B   NVF {len(nvf):>10,} B   {len(raw_json) / len(nvf):6.1f}x smaller")
+    print(f"  parse    json.loads {json_s * 1000:8.2f} ms   NVF header+index {nvf_s * 1000:8.3f} ms")
+    print(f"  to RGB   NVF all frames {nvf_rgb_s * 1000:8.2f} ms   {json_s / nvf_rgb_s:6.1f}x faster than json.loads")
+    print(f"  convert  JSON -> NVF {convert_s * 1000:8.2f} ms (one-off, in the upload job)")
+
+
+if __name__ == "__main__":
+    main()
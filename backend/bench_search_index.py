@@ -0,0 +1,55 @@
+"""Measure AnimationSearchIndex query latency on a synthetic library.
+
+    python bench_search_index.py [--items 100000] [--repeat 20]
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import argparse
+import random
+import time
+
+from animation_search import AnimationSearchIndex
+
+WORDS = ["bølge", "hjerteslag", "regnbue", "fade", "puls", "glimmer", "matrix", "spiral", "stjerne",
+         "lyn", "vand", "ild", "sne", "regn", "blå", "rød", "grøn", "gul", "lilla", "nat", "dag", "sol"]
+TAGS = ["fire", "water", "motion", "effects", "patterns", "colors", "special", "text", "simple", "retro"]
+QUERIES = ["bolge", "hjerteslag", "hjrteslag", "wat", "fire", "st", "fire water", "regnbue fade", "zzz"]
+
+
+def synthetic_library(items: int):
+    rng = random.Random(2608)
+    vocabulary = WORDS + ["".join(rng.choice("abdefghijklmnoprstuvyæøå") for _ in range(rng.randint(4, 9)))
+                          for _ in range(5000)]
+    epoch = datetime(2025, 1, 1)
+    for i in range(items):
+        yield SimpleNamespace(
+            id=str(i),
+            name=" ".join(rng.sample(vocabulary, rng.randint(1, 3))).capitalize(),
+            tags=rng.sample(TAGS, rng.randint(0, 2)),
+            created_at=epoch + timedelta(seconds=i),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    index = AnimationSearchIndex()
+    start = time.perf_counter()
+    for anim in synthetic_library(args.items):
+        index.add(anim)
+    print(f"{args.items:,} items indexed in {time.perf_counter() - start:.2f} s")
+
+    for query in QUERIES:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _, total = index.search(query, limit=20)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {query!r:16} {total:>7,} matches  {best * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
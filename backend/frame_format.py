@@ -0,0 +1,229 @@
+"""Compact binary frame format (.nvf) for frame-based JSON animations.
+
+JSON uploads look like::
+
+    {"width": 16, "height": 16,
+     "frames": [{"delay": 100, "pixels": ["#ff0000", [0, 255, 0], 255, ...]}, ...]}
+
+Pixels are row-major and each is "#rrggbb", [r, g, b] or a 0xRRGGBB integer. The JSON is
+read with ijson when it is installed, so the pixel arrays are never materialised as Python
+lists; otherwise the stdlib parser is used.
+
+Binary layout (little endian)::
+
+    header   16 bytes  magic "NVF1", version u8, bpp u8, width u16, height u16,
+                       frame_count u32, palette_size u16
+    palette  palette_size * 3 bytes RGB
+    delays   frame_count * u16 milliseconds
+    pixels   frame_count * frame_bytes, frame_bytes = ceil(width * height * bpp / 8)
+
+bpp is 4 or 8 (palette indices, high nibble first) or 24 (raw RGB, no palette) when the
+animation uses more than 256 colours.
+"""
+from array import array
+from pathlib import Path
+import json
+import struct
+
+try:
+    import ijson
+except ImportError:  # optional: falls back to json.load
+    ijson = None
+
+MAGIC = b"NVF1"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHHIH")
+MAX_DIMENSION = 1024
+MAX_DELAY = 0xFFFF
+DEFAULT_DELAY = 100
+
+# Nibble expansion tables for 4 bpp frames
+_HIGH_NIBBLE = bytes(b >> 4 for b in range(256))
+_LOW_NIBBLE = bytes(b & 0x0F for b in range(256))
+
+
+class FrameFormatError(ValueError):
+    pass
+
+
+def _color(value) -> int:
+    if isinstance(value, str):
+        text = value[1:] if value.startswith("#") else value
+        if len(text) != 6:
+            raise FrameFormatError(f"Invalid colour {value!r}")
+        try:
+            return int(text, 16)
+        except ValueError:
+            raise FrameFormatError(f"Invalid colour {value!r}")
+    if isinstance(value, (list, tuple)):
+        if len(value) != 3:
+            raise FrameFormatError(f"Invalid colour {value!r}")
+        r, g, b = (_int(c, 255, "colour channel") for c in value)
+        return (r << 16) | (g << 8) | b
+    return _int(value, 0xFFFFFF, "colour")
+
+
+def _int(value, maximum: int, what: str) -> int:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise FrameFormatError(f"Invalid {what} {value!r}")
+    if isinstance(value, (bool, str)) or number != value or not 0 <= number <= maximum:
+        raise FrameFormatError(f"Invalid {what} {value!r}")
+    return number
+
+
+def _delay(value) -> int:
+    return _int(value, MAX_DELAY, "frame delay")
+
+
+def _read_ijson(f):
+    width = height = None
+    frames = []
+    pixels = rgb = None
+    delay = DEFAULT_DELAY
+    for prefix, event, value in ijson.parse(f):
+        if prefix == "frames.item.pixels.item":
+            if event == "start_array":
+                rgb = []
+            elif event == "end_array":
+                pixels.append(_color(rgb))
+            else:
+                pixels.append(_color(value))
+        elif prefix == "frames.item.pixels.item.item":
+            rgb.append(value)
+        elif prefix == "frames.item":
+            if event == "start_map":
+                pixels, delay = array("I"), DEFAULT_DELAY
+            elif event == "end_map":
+                frames.append((delay, pixels))
+        elif prefix == "frames.item.delay":
+            delay = _delay(value if event not in ("start_map", "start_array") else [])
+        elif prefix == "width":
+            width = value
+        elif prefix == "height":
+            height = value
+    return width, height, frames
+
+
+def _read_json(f):
+    try:
+        doc = json.load(f)
+        frames = [(_delay(fr.get("delay", DEFAULT_DELAY)), array("I", (_color(p) for p in fr["pixels"])))
+                  for fr in doc["frames"]]
+        return doc.get("width"), doc.get("height"), frames
+    except (KeyError, TypeError, AttributeError) as e:
+        raise FrameFormatError(f"Unexpected JSON structure: {e!r}")
+
+
+def read_json_frames(f):
+    """Parse and validate a JSON animation; returns (width, height, [(delay, array('I'))])."""
+    try:
+        width, height, frames = _read_ijson(f) if ijson is not None else _read_json(f)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise FrameFormatError(f"Invalid JSON: {e}")
+    except Exception as e:
+        if ijson is not None and isinstance(e, ijson.JSONError):
+            raise FrameFormatError(f"Invalid JSON: {e}")
+        raise
+    # Both parsers hand back the raw values so they accept and reject exactly the same input
+    width = _int(width, MAX_DIMENSION, "width")
+    height = _int(height, MAX_DIMENSION, "height")
+    if not (width and height):
+        raise FrameFormatError(f"Dimensions must be between 1 and {MAX_DIMENSION}")
+    if not frames:
+        raise FrameFormatError("Animation has no frames")
+    for i, (_, pixels) in enumerate(frames):
+        if len(pixels) != width * height:
+            raise FrameFormatError(f"Frame {i} has {len(pixels)} pixels, expected {width * height}")
+    return width, height, frames
+
+
+def encode(width: int, height: int, frames) -> bytes:
+    """Encode [(delay_ms, array('I') of 0xRRGGBB)] frames into NVF bytes."""
+    palette = {}
+    for _, pixels in frames:
+        for c in set(pixels):
+            palette.setdefault(c, len(palette))
+        if len(palette) > 256:
+            break
+    bpp = 4 if len(palette) <= 16 else 8 if len(palette) <= 256 else 24
+    if bpp == 24:
+        palette = {}
+    out = bytearray(HEADER.pack(MAGIC, VERSION, bpp, width, height, len(frames), len(palette)))
+    for c in palette:
+        out += c.to_bytes(3, "big")
+    out += struct.pack(f"<{len(frames)}H", *(delay for delay, _ in frames))
+    for _, pixels in frames:
+        if bpp == 24:
+            out += b"".join(c.to_bytes(3, "big") for c in pixels)
+            continue
+        indices = bytes(palette[c] for c in pixels)
+        if bpp == 8:
+            out += indices
+        else:
+            if len(indices) % 2:
+                indices += b"\x00"
+            out += bytes((indices[i] << 4) | indices[i + 1] for i in range(0, len(indices), 2))
+    return bytes(out)
+
+
+class NVFAnimation:
+    """Decoded view over NVF bytes; frames are sliced lazily without copying the input."""
+
+    def __init__(self, data: bytes):
+        if len(data) < HEADER.size:
+            raise FrameFormatError("Truncated header")
+        magic, version, bpp, width, height, count, palette_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or bpp not in (4, 8, 24):
+            raise FrameFormatError("Not an NVF v1 file")
+        self.bpp, self.width, self.height, self.frame_count = bpp, width, height, count
+        view = memoryview(data)
+        offset = HEADER.size
+        self.palette = bytes(view[offset:offset + palette_size * 3])
+        offset += palette_size * 3
+        self.delays = list(struct.unpack_from(f"<{count}H", data, offset))
+        offset += count * 2
+        self.frame_bytes = (width * height * bpp + 7) // 8
+        self._pixels = view[offset:offset + count * self.frame_bytes]
+        if len(self._pixels) != count * self.frame_bytes:
+            raise FrameFormatError("Truncated pixel data")
+        if bpp != 24:
+            # One translate table per channel maps palette indices straight to colour bytes
+            padded = self.palette.ljust(256 * 3, b"\x00")
+            self._channels = [bytes(padded[i::3]) for i in range(3)]
+
+    def frame(self, i: int) -> memoryview:
+        """Packed pixel data of frame i as stored in the file."""
+        return self._pixels[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+
+    def frame_rgb(self, i: int) -> bytes:
+        """Frame i expanded to row-major RGB24."""
+        packed = bytes(self.frame(i))
+        if self.bpp == 24:
+            return packed
+        pixel_count = self.width * self.height
+        if self.bpp == 4:
+            indices = bytearray(len(packed) * 2)
+            indices[0::2] = packed.translate(_HIGH_NIBBLE)
+            indices[1::2] = packed.translate(_LOW_NIBBLE)
+            packed = bytes(indices[:pixel_count])
+        rgb = bytearray(pixel_count * 3)
+        for channel, table in enumerate(self._channels):
+            rgb[channel::3] = packed.translate(table)
+        return bytes(rgb)
+
+
+def decode(data: bytes) -> NVFAnimation:
+    return NVFAnimation(data)
+
+
+def convert_json_file(src: Path, dst: Path) -> NVFAnimation:
+    """Validate a JSON animation file and write its NVF encoding to dst."""
+    with open(src, "rb") as f:
+        width, height, frames = read_json_frames(f)
+    data = encode(width, height, frames)
+    tmp = dst.with_name(dst.name + ".part")
+    tmp.write_bytes(data)
+    tmp.replace(dst)
+    return NVFAnimation(data)
@@ -0,0 +1,113 @@
+"""Memory-mapped store of unpacked animation frames.
+
+Each animation can be unpacked into <id>.rgb, a raw RGB24 array with one fixed-stride record
+per frame, plus <id>.json holding dimensions, stride and per-frame delays. Frame i starts at
+i * stride, so any range is a single slice of the memory-mapped file.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import json
+import mmap
+import uuid
+
+try:
+    from PIL import Image, ImageSequence
+except ImportError:  # optional: without it GIFs are stored but not unpacked into frames
+    Image = ImageSequence = None
+
+GIF_SUPPORT = Image is not None
+CHANNELS = 3
+DEFAULT_DELAY = 100
+
+
+class FrameStoreError(ValueError):
+    pass
+
+
+class FrameStore:
+    def __init__(self, root: Path, max_open: int = 64, max_bytes: int = 256 * 1024 * 1024):
+        self.root = root
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self._open = OrderedDict()
+
+    def _paths(self, anim_id: str):
+        return [self.root / f"{anim_id}{suffix}" for suffix in (".rgb", ".json", ".rgb.part", ".json.part")]
+
+    def check_size(self, width: int, height: int, count: int):
+        size = width * height * CHANNELS * count
+        if size > self.max_bytes:
+            raise FrameStoreError(f"{count} frames of {width}x{height} need {size} bytes, limit is {self.max_bytes}")
+
+    def write(self, anim_id: str, width: int, height: int, frames) -> int:
+        """Write (rgb_bytes, delay_ms) frames for an animation; returns the frame count."""
+        stride = width * height * CHANNELS
+        data_path, index_path, tmp_path, index_tmp = self._paths(anim_id)
+        delays = []
+        try:
+            with open(tmp_path, 'wb') as f:
+                for pixels, delay in frames:
+                    if len(pixels) != stride:
+                        raise FrameStoreError(f"Frame {len(delays)} has {len(pixels)} bytes, expected {stride}")
+                    self.check_size(width, height, len(delays) + 1)
+                    f.write(pixels)
+                    delays.append(int(delay))
+            if not delays:
+                tmp_path.unlink()
+                return 0
+            index = {"width": width, "height": height, "channels": CHANNELS, "stride": stride,
+                     "count": len(delays), "delays": delays, "version": uuid.uuid4().hex}
+            index_tmp.write_text(json.dumps(index))
+            tmp_path.replace(data_path)
+            index_tmp.replace(index_path)
+        except BaseException:
+            for path in (tmp_path, index_tmp):
+                path.unlink(missing_ok=True)
+            raise
+        # Drop the cached mapping of the previous frames. This may run in a worker thread, so the
+        # old mmap is left for garbage collection instead of being closed under a concurrent read.
+        self._open.pop(anim_id, None)
+        return len(delays)
+
+    def write_gif(self, anim_id: str, path: Path) -> int:
+        with Image.open(path) as im:
+            width, height = im.size
+            # n_frames is read from the file without decoding, so oversized GIFs fail up front
+            self.check_size(width, height, getattr(im, "n_frames", 1))
+            frames = ((frame.convert("RGB").tobytes(), frame.info.get("duration", DEFAULT_DELAY))
+                      for frame in ImageSequence.Iterator(im))
+            return self.write(anim_id, width, height, frames)
+
+    def _get(self, anim_id: str):
+        entry = self._open.get(anim_id)
+        if entry:
+            self._open.move_to_end(anim_id)
+            return entry
+        data_path, index_path = self._paths(anim_id)[:2]
+        if not index_path.exists():
+            return None
+        index = json.loads(index_path.read_text())
+        with open(data_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._open[anim_id] = entry = (index, mapped)
+        while len(self._open) > self.max_open:
+            _, (_, old) = self._open.popitem(last=False)
+            old.close()
+        return entry
+
+    def index(self, anim_id: str) -> Optional[dict]:
+        entry = self._get(anim_id)
+        return entry[0] if entry else None
+
+    def read(self, anim_id: str, start: int, end: int) -> bytes:
+        """Raw pixels of frames start..end inclusive; bounds are checked by the caller."""
+        index, mapped = self._get(anim_id)
+        return mapped[start * index["stride"]:(end + 1) * index["stride"]]
+
+    def delete(self, anim_id: str):
+        entry = self._open.pop(anim_id, None)
+        if entry:
+            entry[1].close()
+        for path in self._paths(anim_id):
+            path.unlink(missing_ok=True)
@@ -1,24 +1,46 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, UploadFile, File, Form
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Query, UploadFile, File, Form
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import uuid
 import hashlib
 import secrets
+import gzip
+import logging
+import re
+import asyncio
+import math
+import time
+import base64
+from collections import Counter, OrderedDict
+
+from animation_search import AnimationSearchIndex
+from frame_format import FrameFormatError, convert_json_file
+from frame_store import GIF_SUPPORT, FrameStore, FrameStoreError
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are produced
+    brotli = None
 
 # Paths & ENV
 ROOT_DIR = Path(__file__).parent
 UPLOADS_DIR = ROOT_DIR / "uploads" / "animations"
 TMP_DIR = ROOT_DIR / "uploads" / "tmp"
+FRAMES_DIR = ROOT_DIR / "uploads" / "frames"
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 TMP_DIR.mkdir(parents=True, exist_ok=True)
+FRAMES_DIR.mkdir(parents=True, exist_ok=True)
 
 load_dotenv(ROOT_DIR / '.env')
 
@@ -27,10 +49,233 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+logger = logging.getLogger(__name__)
+
 # App & Router
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
+# Compression
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_MAX_SIZE = int(os.environ.get("COMPRESS_MAX_SIZE", str(1024 * 1024)))
+# Uploaded files (including .json frame animations) are streamed as-is, never recompressed
+COMPRESS_SKIP_PREFIXES = ("/api/media/",)
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Pick the best content-coding from an Accept-Encoding header, None meaning identity."""
+    preferences = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            preferences[coding] = q
+    # "*" only covers codings the client did not list explicitly (so "gzip;q=0, *" excludes gzip)
+    wildcard_q = preferences.pop("*", None)
+    best, best_q = None, 0.0
+    for candidate in SUPPORTED_ENCODINGS:
+        if candidate not in available:
+            continue
+        q = preferences.get(candidate, wildcard_q or 0.0)
+        if q > best_q:
+            best, best_q = candidate, q
+    return best
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+class JSONCompressionMiddleware:
+    """Compresses JSON API responses between COMPRESS_MIN_SIZE and COMPRESS_MAX_SIZE bytes;
+    everything else passes through untouched."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE, maximum_size: int = COMPRESS_MAX_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.maximum_size = maximum_size
+
+    def should_buffer(self, headers: Headers) -> bool:
+        if not headers.get("content-type", "").startswith("application/json") or "content-encoding" in headers:
+            return False
+        length = headers.get("content-length")
+        return length is None or not length.isdigit() or int(length) <= self.maximum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(COMPRESS_SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), SUPPORTED_ENCODINGS)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                if self.should_buffer(Headers(raw=message["headers"])):
+                    start_message = message
+                    return
+                await send(message)
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if self.minimum_size <= len(body) <= self.maximum_size:
+                body = compress_body(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+app.add_middleware(JSONCompressionMiddleware)
+
+# Rate limiting & admission control
+# Token buckets per (budget, client), where the client is the verified admin user or the
+# remote IP. Budgets are (tokens per second, burst); the first matching rule wins.
+# Configure these two together: behind a reverse proxy every request comes from the proxy's
+# address, so per-client limits need TRUST_PROXY_HEADERS=1 (client IP from X-Forwarded-For;
+# only safe when the proxy sets that header). The limiter therefore defaults to on only when
+# proxy headers are trusted; RATE_LIMIT_ENABLED=1 forces it on for direct deployments.
+TRUST_PROXY_HEADERS = os.environ.get("TRUST_PROXY_HEADERS", "0") == "1"
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1" if TRUST_PROXY_HEADERS else "0") == "1"
+# Least recently used buckets are evicted beyond this many clients x budgets
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", "10000"))
+RATE_LIMITS = [
+    ("POST", re.compile(r"^/api/animations/uploads/start$"), "upload_start", 0.2, 5),
+    ("POST", re.compile(r"^/api/animations/uploads/"), "upload_chunk", 20, 60),
+    ("GET", re.compile(r"^/api/animations(/search|/facets|/popular)?$"), "list", 5, 20),
+    ("GET", re.compile(r"^/api/animations/[^/]+/frames"), "frames", 20, 60),
+    ("GET", re.compile(r"^/api/media/animations/"), "media", 10, 40),
+    (None, re.compile(r"^/api/"), "default", 20, 60),
+]
+# Global caps on requests in flight, held until the response body has been fully sent.
+CONCURRENCY_LIMITS = {
+    "upload": int(os.environ.get("MAX_CONCURRENT_UPLOADS", "8")),
+    "serve": int(os.environ.get("MAX_CONCURRENT_SERVES", "32")),
+}
+CONCURRENCY_POOLS = [
+    ("POST", re.compile(r"^/api/animations/uploads/"), "upload"),
+    ("GET", re.compile(r"^/api/(media/animations/|animations/[^/]+/frames)"), "serve"),
+]
+
+class AdmissionController:
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.in_flight = Counter()
+        self.rejections = Counter()
+        self.rejected_clients = Counter()
+
+    def client_key(self, scope) -> str:
+        headers = Headers(scope=scope)
+        auth = headers.get("authorization", "")
+        if auth.startswith("Basic "):
+            # Unparseable credentials (non-ASCII header, bad base64) just fall back to the IP key
+            try:
+                username, _, password = base64.b64decode(auth[6:]).partition(b":")
+            except ValueError:
+                username = password = b""
+            if (secrets.compare_digest(username, ADMIN_USERNAME.encode())
+                    and secrets.compare_digest(password, ADMIN_PASSWORD.encode())):
+                return f"admin:{ADMIN_USERNAME}"
+        if TRUST_PROXY_HEADERS and headers.get("x-forwarded-for"):
+            return "ip:" + headers["x-forwarded-for"].split(",")[0].strip()
+        return "ip:" + (scope["client"][0] if scope.get("client") else "unknown")
+
+    def take(self, budget: str, client: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 when allowed, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        key = (budget, client)
+        tokens, updated = self.buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        # Re-inserting keeps the dict in least recently used order
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+        self.buckets[key] = (tokens - 1, now)
+        while len(self.buckets) > RATE_LIMIT_MAX_BUCKETS:
+            self.buckets.popitem(last=False)
+        return 0.0
+
+    def reject(self, reason: str, name: str, client: str, status_code: int, retry_after: float):
+        self.rejections[f"{reason}:{name}"] += 1
+        self.rejected_clients[client] += 1
+        if len(self.rejected_clients) > 1000:
+            self.rejected_clients = Counter(dict(self.rejected_clients.most_common(100)))
+        return JSONResponse(
+            {"detail": "Too many requests" if status_code == 429 else "Server busy, retry shortly"},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "trust_proxy_headers": TRUST_PROXY_HEADERS,
+            "buckets": len(self.buckets),
+            "in_flight": {pool: self.in_flight[pool] for pool in CONCURRENCY_LIMITS},
+            "concurrency_limits": CONCURRENCY_LIMITS,
+            "rate_limits": {budget: {"rate": rate, "burst": burst} for _, _, budget, rate, burst in RATE_LIMITS},
+            "rejections": dict(self.rejections),
+            "top_rejected_clients": dict(self.rejected_clients.most_common(10)),
+        }
+
+    async def handle(self, app, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            await app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        client = self.client_key(scope)
+        for rule_method, pattern, budget, rate, burst in RATE_LIMITS:
+            if rule_method in (None, method) and pattern.match(path):
+                wait = self.take(budget, client, rate, burst)
+                if wait:
+                    await self.reject("rate", budget, client, 429, wait)(scope, receive, send)
+                    return
+                break
+        pool = next((p for m, pattern, p in CONCURRENCY_POOLS if m == method and pattern.match(path)), None)
+        if pool is None:
+            await app(scope, receive, send)
+            return
+        if self.in_flight[pool] >= CONCURRENCY_LIMITS[pool]:
+            await self.reject("concurrency", pool, client, 503, 1)(scope, receive, send)
+            return
+        self.in_flight[pool] += 1
+        try:
+            await app(scope, receive, send)
+        finally:
+            self.in_flight[pool] -= 1
+
+admission = AdmissionController()
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        await self.controller.handle(self.app, scope, receive, send)
+
+app.add_middleware(AdmissionMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -69,12 +314,30 @@ class Animation(BaseModel):
     size: int
     tags: List[str] = []
     mime: Optional[str] = None
+    plays: int = 0
+    frames: Optional[int] = None
+    binary_url: Optional[str] = None
+    sha256: Optional[str] = None
+    status: str = "ready"  # processing | ready | failed
+    job_id: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class AnimationList(BaseModel):
     items: List[Animation]
     total: int
 
+class UpdateAnimationRequest(BaseModel):
+    name: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+class TagFacets(BaseModel):
+    tags: List[TagCount]
+    total: int
+
 class StartUploadRequest(BaseModel):
     name: str
     filename: str
@@ -85,6 +348,19 @@ class StartUploadRequest(BaseModel):
 class StartUploadResponse(BaseModel):
     uploadId: str
 
+class Job(BaseModel):
+    id: str
+    type: str
+    status: str  # queued | running | done | failed
+    progress: float = 0.0
+    message: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    error: Optional[str] = None
+    payload: Dict[str, Any] = {}
+    created_at: datetime
+    updated_at: datetime
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -101,6 +377,317 @@ async def get_status_checks():
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**sc) for sc in status_checks]
 
+# ===================== Animations Search Index (in-memory) ===================== #
+
+# Only listed animations are indexed (and counted in tag facets); processing and failed uploads
+# enter the index when their job marks them ready. Animations stored before processing states
+# existed have no status and count as ready.
+LISTED_QUERY = {"status": {"$in": ["ready", None]}}
+
+search_index = AnimationSearchIndex()
+
+def is_listed(doc: Optional[dict]) -> bool:
+    return bool(doc) and doc.get("status", "ready") in ("ready", None)
+
+# ===================== Tag Facets & Play Counters ===================== #
+
+# Tag counts are kept in animation_tag_counts ({_id: tag, count}) and mirrored in memory, so
+# facet requests never aggregate over the animations collection.
+tag_counts = Counter()
+
+async def adjust_tag_counts(added: List[str] = (), removed: List[str] = ()):
+    delta = Counter(set(added))
+    delta.subtract(set(removed))
+    ops = [UpdateOne({"_id": tag}, {"$inc": {"count": n}}, upsert=True) for tag, n in delta.items() if n]
+    if not ops:
+        return
+    await db.animation_tag_counts.bulk_write(ops, ordered=False)
+    await db.animation_tag_counts.delete_many({"count": {"$lte": 0}})
+    tag_counts.update(delta)
+    for tag in [t for t, n in tag_counts.items() if n <= 0]:
+        del tag_counts[tag]
+
+async def load_tag_counts():
+    if await db.animation_tag_counts.estimated_document_count() == 0 and len(search_index):
+        # One-off backfill for libraries created before counters existed
+        counts = Counter(tag for anim in search_index.all() for tag in set(anim.tags))
+        if counts:
+            await db.animation_tag_counts.insert_many([{"_id": t, "count": n} for t, n in counts.items()])
+    tag_counts.clear()
+    async for doc in db.animation_tag_counts.find():
+        tag_counts[doc["_id"]] = doc["count"]
+
+# Plays are counted per served file in memory and flushed in one bulk write per interval.
+PLAY_FLUSH_INTERVAL = float(os.environ.get("PLAY_FLUSH_INTERVAL", "30"))
+pending_plays = Counter()
+
+def play_owner_query(filename: str) -> dict:
+    # Downloads of the binary frame encoding count towards the animation that owns it
+    if filename.endswith(".nvf"):
+        return {"binary_url": f"/media/animations/{filename}"}
+    return {"filename": filename}
+
+async def flush_play_counts():
+    global pending_plays
+    if not pending_plays:
+        return
+    batch, pending_plays = pending_plays, Counter()
+    ops = [UpdateOne(play_owner_query(filename), {"$inc": {"plays": n}}) for filename, n in batch.items()]
+    try:
+        await db.animations.bulk_write(ops, ordered=False)
+    except Exception:
+        # Keep the counts for the next flush rather than dropping them
+        pending_plays.update(batch)
+
+async def play_flush_loop():
+    while True:
+        await asyncio.sleep(PLAY_FLUSH_INTERVAL)
+        await flush_play_counts()
+
+# ===================== Packed Frame Store ===================== #
+
+# Unpacked frames live in FRAMES_DIR (see frame_store.py). The caps keep a small, highly
+# compressed GIF from turning into a huge .rgb file, and a single range request from copying
+# a huge slice of it into memory.
+FRAME_STORE_MAX_OPEN = int(os.environ.get("FRAME_STORE_MAX_OPEN", "64"))
+FRAME_STORE_MAX_BYTES = int(os.environ.get("FRAME_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+FRAME_RANGE_MAX_BYTES = int(os.environ.get("FRAME_RANGE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+frame_store = FrameStore(FRAMES_DIR, max_open=FRAME_STORE_MAX_OPEN, max_bytes=FRAME_STORE_MAX_BYTES)
+
+# The client's mime type is a form default in the admin UI, so it is only the last resort
+ANIMATION_EXTENSIONS = {".gif": "gif", ".json": "json"}
+ANIMATION_MIMES = {"image/gif": "gif", "application/json": "json"}
+
+def animation_kind(path: Path, mime: Optional[str]) -> Optional[str]:
+    """Return "gif" or "json" based on the file extension, then the content, then the mime type."""
+    kind = ANIMATION_EXTENSIONS.get(path.suffix.lower())
+    if kind:
+        return kind
+    with open(path, 'rb') as f:
+        head = f.read(64).removeprefix(b"\xef\xbb\xbf").lstrip()
+    if head.startswith(b"GIF8"):
+        return "gif"
+    if head.startswith(b"{"):
+        return "json"
+    return ANIMATION_MIMES.get(mime)
+
+def binary_filename(filename: str) -> str:
+    return filename.split(".", 1)[0] + ".nvf"
+
+def delete_animation_files(anim_id: str, filename: str):
+    """Remove an animation's upload, its binary frame encoding and its frame store entry."""
+    for path in (UPLOADS_DIR / filename, UPLOADS_DIR / binary_filename(filename)):
+        try:
+            if path.exists():
+                path.unlink()
+        except Exception:
+            pass
+    frame_store.delete(anim_id)
+
+def convert_json_animation(anim_id: str, path: Path) -> int:
+    """Write the .nvf encoding next to the upload and unpack it into the frame store."""
+    nvf = convert_json_file(path, UPLOADS_DIR / binary_filename(path.name))
+    frames = ((nvf.frame_rgb(i), nvf.delays[i]) for i in range(nvf.frame_count))
+    try:
+        frame_store.write(anim_id, nvf.width, nvf.height, frames)
+    except FrameStoreError:
+        # Too large to unpack: the .nvf is still served, the frames just can't be scrubbed
+        frame_store.delete(anim_id)
+    return nvf.frame_count
+
+# ===================== Background Jobs ===================== #
+
+# Jobs are documents in the jobs collection. Workers claim one with an atomic
+# find_one_and_update that sets a lease; a job whose lease expires (e.g. the process died)
+# is claimed again while it has attempts left, otherwise it is failed. Failures are retried
+# with exponential backoff up to max_attempts. Every write after the claim is fenced on the
+# attempt number, so a worker that lost its lease cannot overwrite the new owner's state.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE = float(os.environ.get("JOB_BACKOFF_BASE", "2"))
+JOB_LEASE_SECONDS = 300
+JOB_POLL_INTERVAL = 1.0
+
+JOB_HANDLERS = {}
+job_wakeup = asyncio.Event()
+
+class PermanentJobError(Exception):
+    """Raised by handlers for failures that retrying cannot fix (e.g. invalid input)."""
+
+def job_handler(job_type: str, on_failure=None):
+    """Register `async def handler(job, report)` for a job type; on_failure(job) runs once retries are exhausted."""
+    def register(fn):
+        JOB_HANDLERS[job_type] = (fn, on_failure)
+        return fn
+    return register
+
+async def enqueue_job(job_type: str, payload: dict, job_id: Optional[str] = None) -> Job:
+    now = datetime.utcnow()
+    job = Job(id=job_id or str(uuid.uuid4()), type=job_type, status="queued", max_attempts=JOB_MAX_ATTEMPTS,
+              payload=payload, created_at=now, updated_at=now)
+    await db.jobs.insert_one({"_id": job.id, **job.dict(), "next_run_at": now})
+    job_wakeup.set()
+    return job
+
+async def claim_job() -> Optional[dict]:
+    now = datetime.utcnow()
+    return await db.jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "next_run_at": {"$lte": now}},
+            {"status": "running", "lease_until": {"$lt": now}, "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+        ]},
+        {"$set": {"status": "running", "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS), "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("next_run_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+def job_owner(doc: dict) -> dict:
+    return {"_id": doc["_id"], "status": "running", "attempts": doc["attempts"]}
+
+async def update_owned_job(doc: dict, fields: dict):
+    fields["updated_at"] = datetime.utcnow()
+    await db.jobs.update_one(job_owner(doc), {"$set": fields})
+
+async def renew_job_lease(doc: dict, **fields):
+    fields["lease_until"] = datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+    await update_owned_job(doc, fields)
+
+async def run_blocking(job: dict, fn, *args):
+    """Run fn in the thread pool, renewing the job's lease until it returns."""
+    async def keep_alive():
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await renew_job_lease(job)
+            except Exception:
+                logger.exception("Could not renew lease of job %s", job["_id"])
+
+    renewer = asyncio.create_task(keep_alive())
+    try:
+        return await run_in_threadpool(fn, *args)
+    finally:
+        renewer.cancel()
+
+async def fail_job(doc: dict, error: str):
+    await update_owned_job(doc, {"status": "failed", "error": error})
+    _, on_failure = JOB_HANDLERS.get(doc["type"], (None, None))
+    if on_failure:
+        await on_failure(doc)
+
+async def run_job(doc: dict):
+    if doc["type"] not in JOB_HANDLERS:
+        await fail_job(doc, f"Unknown job type {doc['type']!r}")
+        return
+    handler, _ = JOB_HANDLERS[doc["type"]]
+
+    async def report(progress: float, message: Optional[str] = None):
+        await renew_job_lease(doc, progress=progress, message=message)
+
+    try:
+        await handler(doc, report)
+    except Exception as e:
+        if doc["attempts"] < doc["max_attempts"] and not isinstance(e, PermanentJobError):
+            delay = JOB_BACKOFF_BASE ** doc["attempts"]
+            await update_owned_job(doc, {
+                "status": "queued", "error": repr(e),
+                "next_run_at": datetime.utcnow() + timedelta(seconds=delay),
+            })
+        else:
+            await fail_job(doc, repr(e))
+        return
+    await update_owned_job(doc, {"status": "done", "progress": 1.0, "message": None, "error": None})
+
+async def fail_abandoned_jobs():
+    """Fail jobs whose worker died on their last attempt; claim_job no longer picks them up."""
+    query = {"status": "running", "lease_until": {"$lt": datetime.utcnow()},
+             "$expr": {"$gte": ["$attempts", "$max_attempts"]}}
+    async for doc in db.jobs.find(query):
+        await fail_job(doc, "Worker lost during final attempt")
+
+async def job_worker():
+    while True:
+        try:
+            doc = await claim_job()
+        except Exception:
+            logger.exception("Could not claim a job")
+            doc = None
+        if doc is None:
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            job_wakeup.clear()
+            continue
+        try:
+            await run_job(doc)
+        except Exception:
+            # Bookkeeping failed (e.g. Mongo unavailable); the lease expiry hands the job back
+            logger.exception("Job %s could not be completed", doc["_id"])
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+async def abandoned_job_sweeper():
+    while True:
+        try:
+            await fail_abandoned_jobs()
+        except Exception:
+            logger.exception("Could not sweep abandoned jobs")
+        await asyncio.sleep(JOB_LEASE_SECONDS)
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+async def mark_animation_failed(job: dict):
+    # Never un-list an animation that already made it to ready
+    await db.animations.update_one({"id": job["payload"]["anim_id"], "status": {"$ne": "ready"}},
+                                   {"$set": {"status": "failed"}})
+
+@job_handler("process_animation", on_failure=mark_animation_failed)
+async def process_animation(job: dict, report):
+    anim_id = job["payload"]["anim_id"]
+    doc = await db.animations.find_one({"id": anim_id})
+    if not doc:
+        raise PermanentJobError(f"Animation {anim_id} not found")
+    path = UPLOADS_DIR / doc["filename"]
+
+    await report(0.1, "hashing")
+    changes = {"sha256": await run_blocking(job, sha256_file, path)}
+
+    kind = animation_kind(path, doc.get("mime"))
+    if kind == "gif" and GIF_SUPPORT:
+        await report(0.4, "unpacking frames")
+        try:
+            changes["frames"] = await run_blocking(job, frame_store.write_gif, anim_id, path)
+        except Exception:
+            # Undecodable GIFs are still served as-is; they just can't be scrubbed
+            frame_store.delete(anim_id)
+    elif kind == "json":
+        await report(0.4, "converting frames")
+        try:
+            changes["frames"] = await run_blocking(job, convert_json_animation, anim_id, path)
+        except FrameFormatError as e:
+            raise PermanentJobError(f"Invalid frame JSON: {e}")
+        changes["binary_url"] = f"/media/animations/{binary_filename(doc['filename'])}"
+
+    changes["status"] = "ready"
+    before = await db.animations.find_one_and_update({"id": anim_id}, {"$set": changes},
+                                                     return_document=ReturnDocument.BEFORE)
+    if before is None:
+        # Deleted while processing: the delete ran before the files above were written
+        delete_animation_files(anim_id, doc["filename"])
+        raise PermanentJobError(f"Animation {anim_id} was deleted during processing")
+    # The returned document includes any PATCH made while processing; a rerun of an already
+    # ready animation only refreshes the index entry
+    anim = Animation(**{**before, **changes})
+    search_index.add(anim)
+    if not is_listed(before):
+        await adjust_tag_counts(added=anim.tags)
+
 # ===================== Animations Library (Chunked Upload + Listing) ===================== #
 
 @api_router.post("/animations/uploads/start", response_model=StartUploadResponse)
@@ -159,6 +746,7 @@ async def finish_animation_upload(upload_id: str, _=Depends(verify_admin)):
 
     size = final_path.stat().st_size
 
+    # Hashing and frame unpacking run in the job queue; the animation is listed as "processing" until then
     anim = Animation(
         name=doc["name"],
         filename=final_name,
@@ -166,182 +754,253 @@ async def finish_animation_upload(upload_id: str, _=Depends(verify_admin)):
         size=size,
         tags=doc.get("tags", []),
         mime=doc.get("mime"),
+        status="processing",
+        job_id=str(uuid.uuid4()),
     )
-    await db.animations.insert_one(anim.dict())
+    try:
+        await db.animations.insert_one(anim.dict())
+        await enqueue_job("process_animation", {"anim_id": anim.id}, job_id=anim.job_id)
+    except Exception:
+        # Roll back so the upload can be finished again instead of leaving an animation that
+        # no job will ever process
+        await db.animations.delete_one({"id": anim.id})
+        final_path.rename(temp_path)
+        raise
     await db.animation_uploads.update_one({"_id": upload_id}, {"$set": {"completed": True, "final_path": str(final_path)}})
     return anim
 
 @api_router.get("/animations", response_model=AnimationList)
-async def list_animations(search: Optional[str] = None, tags: Optional[str] = None, limit: int = 50, offset: int = 0):
-    query = {}
+async def list_animations(search: Optional[str] = None, tags: Optional[str] = None,
+                          status: Optional[str] = Query(None, pattern="^(ready|processing|failed|all)$"),
+                          limit: int = Query(50, ge=0), offset: int = Query(0, ge=0)):
+    """Ready animations by default; status=processing|failed|all is for the admin library view."""
+    tag_list = [t.strip() for t in tags.split(',') if t.strip()] if tags else None
     if search:
-        query["name"] = {"$regex": search, "$options": "i"}
-    if tags:
-        query["tags"] = {"$all": [t.strip() for t in tags.split(',') if t.strip()]}
+        if status not in (None, "ready"):
+            raise HTTPException(status_code=400, detail="search only covers ready animations")
+        # Same matcher as /animations/search and /animations/facets, so counts describe this list
+        items, total = search_index.search(search, tag_list, limit=limit, offset=offset)
+        return AnimationList(items=items, total=total)
+    if status in (None, "ready"):
+        query = dict(LISTED_QUERY)
+    else:
+        query = {} if status == "all" else {"status": status}
+    if tag_list:
+        query["tags"] = {"$all": tag_list}
     total = await db.animations.count_documents(query)
     docs = await db.animations.find(query).skip(offset).limit(limit).sort("created_at", -1).to_list(length=limit)
     items = [Animation(**d) for d in docs]
     return AnimationList(items=items, total=total)
 
+@api_router.get("/animations/search", response_model=AnimationList)
+async def search_animations(q: str, tags: Optional[str] = None, limit: int = Query(20, ge=0, le=100), offset: int = Query(0, ge=0)):
+    tag_list = [t.strip() for t in tags.split(',') if t.strip()] if tags else None
+    items, total = search_index.search(q, tag_list, limit=limit, offset=offset)
+    return AnimationList(items=items, total=total)
+
+@api_router.get("/animations/facets", response_model=TagFacets)
+async def animation_facets(search: Optional[str] = None, tags: Optional[str] = None):
+    tag_list = [t.strip() for t in tags.split(',') if t.strip()] if tags else None
+    if not search and not tag_list:
+        counts = tag_counts
+        total = len(search_index)
+    else:
+        ids = search_index.match_ids(search, tag_list) if search else search_index.tag_ids(tag_list)
+        counts = search_index.tag_counts(ids)
+        total = len(ids)
+    items = [TagCount(tag=t, count=n) for t, n in counts.most_common()]
+    return TagFacets(tags=items, total=total)
+
+@api_router.get("/animations/popular", response_model=AnimationList)
+async def popular_animations(limit: int = 20):
+    docs = await db.animations.find(LISTED_QUERY).sort("plays", -1).limit(limit).to_list(length=limit)
+    items = [Animation(**d) for d in docs]
+    return AnimationList(items=items, total=len(items))
+
+@api_router.patch("/animations/{anim_id}", response_model=Animation)
+async def update_animation(anim_id: str, payload: UpdateAnimationRequest, _=Depends(verify_admin)):
+    doc = await db.animations.find_one({"id": anim_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Not found")
+    changes = {k: v for k, v in payload.dict().items() if v is not None}
+    if changes:
+        # The document as it was when this update applied decides whether it was listed, so a
+        # concurrent ready transition counts the tags exactly once
+        doc = await db.animations.find_one_and_update({"id": anim_id}, {"$set": changes},
+                                                      return_document=ReturnDocument.BEFORE) or doc
+    listed = is_listed(doc)
+    if listed and "tags" in changes:
+        await adjust_tag_counts(added=changes["tags"], removed=doc.get("tags", []))
+    doc.update(changes)
+    anim = Animation(**doc)
+    if listed:
+        search_index.add(anim)
+    return anim
+
 @api_router.delete("/animations/{anim_id}")
 async def delete_animation(anim_id: str, _=Depends(verify_admin)):
     doc = await db.animations.find_one({"id": anim_id})
     if not doc:
         raise HTTPException(status_code=404, detail="Not found")
-    # delete file
-    path = UPLOADS_DIR / doc["filename"]
-    try:
-        if path.exists():
-            path.unlink()
-    except Exception:
-        pass
-    await db.animations.delete_one({"id": anim_id})
+    delete_animation_files(anim_id, doc["filename"])
+    doc = await db.animations.find_one_and_delete({"id": anim_id})
+    search_index.remove(anim_id)
+    if is_listed(doc):
+        await adjust_tag_counts(removed=doc.get("tags", []))
     return {"ok": True}
 
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str, _=Depends(verify_admin)):
+    doc = await db.jobs.find_one({"_id": job_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job(**doc)
+
 @api_router.get("/media/animations/{filename}")
 async def serve_animation_file(filename: str):
     path = UPLOADS_DIR / filename
     if not path.exists():
         raise HTTPException(status_code=404, detail="File not found")
+    pending_plays[filename] += 1
+    if filename.endswith(".nvf"):
+        return FileResponse(path, media_type="application/octet-stream")
     return FileResponse(path)
 
-# ============== Simple Admin UI (Basic Auth) ============== #
-
-ADMIN_HTML = """
-<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="utf-8"/>
-  <meta name="viewport" content="width=device-width, initial-scale=1"/>
-  <title>Animations Admin</title>
-  <style>
-    body { font-family: system-ui, -apple-system, Segoe UI, Roboto, Arial; background:#0b141b; color:#e6f0ff; margin:0; }
-    .wrap { max-width: 920px; margin: 0 auto; padding: 24px; }
-    .card { background:#0f2741; border-radius:12px; padding:16px; margin-bottom:16px; }
-    .row { display:flex; gap:12px; align-items:center; flex-wrap:wrap; }
-    input, button, select { padding:10px 12px; border-radius:8px; border:1px solid #274864; background:#0d253d; color:#e6f0ff; }
-    button { background:#3aa0ff; border:none; cursor:pointer; }
-    .drop { border:2px dashed #274864; padding:24px; text-align:center; border-radius:12px; }
-    .progress { height:10px; background:#27384d; border-radius:6px; overflow:hidden; }
-    .bar { height:100%; width:0%; background:#18d56b; }
-    table { width:100%; border-collapse: collapse; }
-    th, td { padding:8px; border-bottom:1px solid #274864; }
-  </style>
-</head>
-<body>
-  <div class="wrap">
-    <h2>Animations Library Admin</h2>
-    <div class="card">
-      <div class="row">
-        <input id="name" placeholder="Name (e.g. Rainbow Spiral)" style="flex:1" />
-        <input id="tags" placeholder="Tags (comma separated)" style="flex:2"/>
-        <select id="mime">
-          <option value="image/gif">GIF</option>
-          <option value="application/json">JSON (frames)</option>
-        </select>
-      </div>
-      <div id="drop" class="drop" style="margin-top:12px;">Drop file here or click to choose</div>
-      <input type="file" id="file" style="display:none" />
-      <div class="progress" style="margin-top:12px;"><div id="bar" class="bar"></div></div>
-      <div id="msg" style="margin-top:8px; opacity:0.8;"></div>
-    </div>
-
-    <div class="card">
-      <h3>Library</h3>
-      <table>
-        <thead><tr><th>Name</th><th>Size</th><th>Tags</th><th>URL</th><th></th></tr></thead>
-        <tbody id="list"></tbody>
-      </table>
-    </div>
-  </div>
-<script>
-(async function(){
-  // Basic Auth is handled by the browser after initial challenge; do not override Authorization header in fetch calls.
-const creds = null;
-  const drop = document.getElementById('drop');
-  const fileInput = document.getElementById('file');
-  const bar = document.getElementById('bar');
-  const msg = document.getElementById('msg');
-  const list = document.getElementById('list');
-
-  function human(n){ if(n<1024) return n+' B'; if(n<1024*1024) return (n/1024).toFixed(1)+' KB'; return (n/1024/1024).toFixed(1)+' MB'; }
-
-  async function refresh(){
-    const res = await fetch('/api/animations');
-    const data = await res.json();
-    list.innerHTML = '';
-    data.items.forEach(it=>{
-      const tr = document.createElement('tr');
-      tr.innerHTML = `<td>${it.name}</td><td>${human(it.size)}</td><td>${(it.tags||[]).join(', ')}</td><td><a href="${it.url}" target="_blank">Open</a></td><td><button data-id="${it.id}">Delete</button></td>`;
-      tr.querySelector('button').onclick = async()=>{
-        if(confirm('Delete '+it.name+'?')){
-          const r = await fetch('/api/animations/'+it.id, {method:'DELETE', headers:{'Authorization': creds}});
-          if(r.ok) refresh();
-        }
-      };
-      list.appendChild(tr);
-    })
-  }
-
-  drop.onclick = ()=> fileInput.click();
-  drop.ondragover = (e)=>{e.preventDefault(); drop.style.opacity=0.7};
-  drop.ondragleave = ()=>{drop.style.opacity=1};
-  drop.ondrop = (e)=>{e.preventDefault(); drop.style.opacity=1; if(e.dataTransfer.files[0]) startUpload(e.dataTransfer.files[0]); }
-  fileInput.onchange = ()=>{ if(fileInput.files[0]) startUpload(fileInput.files[0]); };
-
-  async function startUpload(file){
-    const name = document.getElementById('name').value || file.name;
-    const tags = document.getElementById('tags').value.split(',').map(s=>s.trim()).filter(Boolean);
-    const mime = document.getElementById('mime').value || file.type;
-
-    msg.textContent = 'Starting upload...';
-    bar.style.width = '0%';
-
-    const startRes = await fetch('/api/animations/uploads/start', {
-      method:'POST',
-      headers:{'Content-Type':'application/json', 'Authorization': creds},
-      body: JSON.stringify({ name, filename: file.name, size: file.size, tags, mime })
-    });
-    if(!startRes.ok){ msg.textContent = 'Start failed'; return; }
-    const { uploadId } = await startRes.json();
-
-    const chunkSize = 1024*1024; // 1MB
-    let sent = 0; let part = 0;
-    while(sent < file.size){
-      const chunk = file.slice(sent, Math.min(sent+chunkSize, file.size));
-      const buf = await chunk.arrayBuffer();
-      const res = await fetch('/api/animations/uploads/'+uploadId, { method:'POST', headers:{'Authorization': creds}, body: buf });
-      if(!res.ok){ msg.textContent = 'Chunk failed'; return; }
-      sent += buf.byteLength; part++;
-      bar.style.width = Math.round(sent*100/file.size)+'%';
+@api_router.get("/animations/{anim_id}/frames")
+async def get_frame_index(anim_id: str):
+    index = frame_store.index(anim_id)
+    if not index:
+        raise HTTPException(status_code=404, detail="Frames not available")
+    return index
+
+@api_router.get("/animations/{anim_id}/frames/{frame_range}")
+async def get_frames(anim_id: str, frame_range: str, request: Request):
+    index = frame_store.index(anim_id)
+    if not index:
+        raise HTTPException(status_code=404, detail="Frames not available")
+    try:
+        start_s, _, end_s = frame_range.partition("-")
+        start = int(start_s)
+        end = int(end_s) if end_s else start
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Frame range must be <start>-<end> or <frame>")
+    if start < 0 or end < start or end >= index["count"]:
+        raise HTTPException(status_code=416, detail=f"Frame range outside 0-{index['count'] - 1}")
+    max_frames = max(1, FRAME_RANGE_MAX_BYTES // index["stride"])
+    if end - start + 1 > max_frames:
+        raise HTTPException(status_code=413, detail=f"At most {max_frames} frames per request")
+    # Frames can be rewritten (e.g. a retried job), so clients revalidate against the store version
+    etag = f'"{index.get("version", "0")}-{start}-{end}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, no-cache",
+        "X-Frame-Width": str(index["width"]),
+        "X-Frame-Height": str(index["height"]),
+        "X-Frame-Start": str(start),
+        "X-Frame-Count": str(end - start + 1),
+        "X-Frame-Delays": ",".join(str(d) for d in index["delays"][start:end + 1]),
     }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=frame_store.read(anim_id, start, end), media_type="application/octet-stream", headers=headers)
 
-    const finRes = await fetch('/api/animations/uploads/'+uploadId+'/finish', { method:'POST', headers:{'Authorization': creds} });
-    if(!finRes.ok){ msg.textContent = 'Finalize failed'; return; }
-    msg.textContent = 'Upload complete';
-    refresh();
-  }
+# ============== Simple Admin UI (Basic Auth) ============== #
 
-  refresh();
-})();
-</script>
-</body>
-</html>
-"""
+# The admin UI lives in static/admin. Assets are fingerprinted and precompressed once at
+# startup, so requests only pick a variant instead of re-rendering or re-compressing.
+ADMIN_STATIC_DIR = ROOT_DIR / "static" / "admin"
+ADMIN_ASSET_FILES = {"admin.css": "text/css; charset=utf-8", "admin.js": "application/javascript; charset=utf-8"}
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class StaticAsset:
+    def __init__(self, content: bytes, media_type: str):
+        digest = hashlib.sha256(content).hexdigest()
+        self.media_type = media_type
+        self.version = digest[:10]
+        self.etag = f'"{digest[:16]}"'
+        self.variants = {None: content, "gzip": gzip.compress(content, compresslevel=9)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(content, quality=11)
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), self.variants)
+        etag = self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.variants[encoding], media_type=self.media_type, headers=headers)
+
+def _build_admin_assets():
+    assets = {}
+    urls = {}
+    for name, media_type in ADMIN_ASSET_FILES.items():
+        content = (ADMIN_STATIC_DIR / name).read_bytes()
+        asset = StaticAsset(content, media_type)
+        stem, ext = name.rsplit(".", 1)
+        versioned = f"{stem}.{asset.version}.{ext}"
+        assets[versioned] = asset
+        urls["{{" + name + "}}"] = f"/api/admin/assets/{versioned}"
+    html = (ADMIN_STATIC_DIR / "animations.html").read_text(encoding="utf-8")
+    for placeholder, url in urls.items():
+        html = html.replace(placeholder, url)
+    return StaticAsset(html.encode("utf-8"), "text/html; charset=utf-8"), assets
+
+ADMIN_PAGE, ADMIN_ASSETS = _build_admin_assets()
+
+@api_router.get("/admin/limits")
+async def admin_limits(_=Depends(verify_admin)):
+    return admission.stats()
 
 @api_router.get("/admin/animations")
-async def admin_page(_=Depends(verify_admin)):
-    # The browser will send the Authorization header automatically when using Basic Auth.
-    # Our inline JS expects the same header for the protected POST/DELETE; we precompute a placeholder token.
-    import base64
-    token = "Basic " + base64.b64encode(f"{ADMIN_USERNAME}:{ADMIN_PASSWORD}".encode()).decode()
-    html = ADMIN_HTML.replace('NEED_BASIC_AUTH', token)
-    return HTMLResponse(html)
+async def admin_page(request: Request, _=Depends(verify_admin)):
+    # The page references fingerprinted assets, so it must be revalidated but the assets never do.
+    return ADMIN_PAGE.response(request, "private, no-cache")
+
+@api_router.get("/admin/assets/{name}")
+async def admin_asset(name: str, request: Request):
+    asset = ADMIN_ASSETS.get(name)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset.response(request, ASSET_CACHE_CONTROL)
 
 # Mount router
 app.include_router(api_router)
 
+# Startup
+@app.on_event("startup")
+async def check_rate_limit_config():
+    if RATE_LIMIT_ENABLED and not TRUST_PROXY_HEADERS:
+        logger.warning("Rate limiting is keyed on the socket peer address (TRUST_PROXY_HEADERS=0); "
+                       "behind a reverse proxy all clients share one bucket")
+
+@app.on_event("startup")
+async def build_search_index():
+    await db.animations.create_index([("status", 1), ("created_at", -1)])
+    async for doc in db.animations.find(LISTED_QUERY):
+        search_index.add(Animation(**doc))
+    await load_tag_counts()
+
+@app.on_event("startup")
+async def start_play_counter():
+    await db.animations.create_index("plays")
+    # Play flushes match on these fields, one update per distinct file played
+    await db.animations.create_index("filename")
+    await db.animations.create_index("binary_url", sparse=True)
+    app.state.play_flush_task = asyncio.create_task(play_flush_loop())
+
+@app.on_event("startup")
+async def start_job_workers():
+    await db.jobs.create_index([("status", 1), ("next_run_at", 1)])
+    app.state.job_workers = [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    app.state.job_workers.append(asyncio.create_task(abandoned_job_sweeper()))
+
 # Shutdown
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in app.state.job_workers:
+        task.cancel()
+    app.state.play_flush_task.cancel()
+    await flush_play_counts()
     client.close()
\ No newline at end of file
@@ -0,0 +1,84 @@
+(async function(){
+  // Basic Auth is handled by the browser after initial challenge; do not override Authorization header in fetch calls.
+const creds = null;
+  const drop = document.getElementById('drop');
+  const fileInput = document.getElementById('file');
+  const bar = document.getElementById('bar');
+  const msg = document.getElementById('msg');
+  const list = document.getElementById('list');
+
+  function human(n){ if(n<1024) return n+' B'; if(n<1024*1024) return (n/1024).toFixed(1)+' KB'; return (n/1024/1024).toFixed(1)+' MB'; }
+
+  async function refresh(){
+    const res = await fetch('/api/animations?status=all');
+    const data = await res.json();
+    list.innerHTML = '';
+    data.items.forEach(it=>{
+      const tr = document.createElement('tr');
+      const state = it.status && it.status !== 'ready' ? ' ('+it.status+')' : '';
+      tr.innerHTML = `<td>${it.name}${state}</td><td>${human(it.size)}</td><td>${(it.tags||[]).join(', ')}</td><td><a href="${it.url}" target="_blank">Open</a></td><td><button data-id="${it.id}">Delete</button></td>`;
+      tr.querySelector('button').onclick = async()=>{
+        if(confirm('Delete '+it.name+'?')){
+          const r = await fetch('/api/animations/'+it.id, {method:'DELETE', headers:{'Authorization': creds}});
+          if(r.ok) refresh();
+        }
+      };
+      list.appendChild(tr);
+    })
+  }
+
+  drop.onclick = ()=> fileInput.click();
+  drop.ondragover = (e)=>{e.preventDefault(); drop.style.opacity=0.7};
+  drop.ondragleave = ()=>{drop.style.opacity=1};
+  drop.ondrop = (e)=>{e.preventDefault(); drop.style.opacity=1; if(e.dataTransfer.files[0]) startUpload(e.dataTransfer.files[0]); }
+  fileInput.onchange = ()=>{ if(fileInput.files[0]) startUpload(fileInput.files[0]); };
+
+  async function startUpload(file){
+    const name = document.getElementById('name').value || file.name;
+    const tags = document.getElementById('tags').value.split(',').map(s=>s.trim()).filter(Boolean);
+    const mime = document.getElementById('mime').value || file.type;
+
+    msg.textContent = 'Starting upload...';
+    bar.style.width = '0%';
+
+    const startRes = await fetch('/api/animations/uploads/start', {
+      method:'POST',
+      headers:{'Content-Type':'application/json', 'Authorization': creds},
+      body: JSON.stringify({ name, filename: file.name, size: file.size, tags, mime })
+    });
+    if(!startRes.ok){ msg.textContent = 'Start failed'; return; }
+    const { uploadId } = await startRes.json();
+
+    const chunkSize = 1024*1024; // 1MB
+    let sent = 0; let part = 0;
+    while(sent < file.size){
+      const chunk = file.slice(sent, Math.min(sent+chunkSize, file.size));
+      const buf = await chunk.arrayBuffer();
+      const res = await fetch('/api/animations/uploads/'+uploadId, { method:'POST', headers:{'Authorization': creds}, body: buf });
+      if(!res.ok){ msg.textContent = 'Chunk failed'; return; }
+      sent += buf.byteLength; part++;
+      bar.style.width = Math.round(sent*100/file.size)+'%';
+    }
+
+    const finRes = await fetch('/api/animations/uploads/'+uploadId+'/finish', { method:'POST', headers:{'Authorization': creds} });
+    if(!finRes.ok){ msg.textContent = 'Finalize failed'; return; }
+    const anim = await finRes.json();
+    refresh();
+    if(anim.job_id) await waitForJob(anim.job_id);
+    else msg.textContent = 'Upload complete';
+  }
+
+  async function waitForJob(jobId){
+    while(true){
+      const res = await fetch('/api/jobs/'+jobId);
+      if(!res.ok){ msg.textContent = 'Upload complete (processing status unavailable)'; return; }
+      const job = await res.json();
+      if(job.status === 'done'){ msg.textContent = 'Upload complete'; refresh(); return; }
+      if(job.status === 'failed'){ msg.textContent = 'Processing failed: '+(job.error||'unknown error'); refresh(); return; }
+      msg.textContent = 'Processing'+(job.message ? ' ('+job.message+')' : '')+'... '+Math.round(job.progress*100)+'%';
+      await new Promise(r=>setTimeout(r, 1000));
+    }
+  }
+
+  refresh();
+})();
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Backend modules are imported as top-level modules, the same way server.py imports them
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from animation_search import AnimationSearchIndex, normalize_text, tokenize
+
+EPOCH = datetime(2025, 1, 1)
+
+
+def anim(anim_id, name, tags=(), age=0):
+    return SimpleNamespace(id=anim_id, name=name, tags=list(tags), created_at=EPOCH - timedelta(days=age))
+
+
+def names(result):
+    items, _ = result
+    return [a.name for a in items]
+
+
+@pytest.fixture
+def index():
+    idx = AnimationSearchIndex()
+    for a in [
+        anim("1", "Bølge", ["motion"]),
+        anim("2", "Hjerteslag", ["patterns"]),
+        anim("3", "Regnbue Fade", ["farver", "fade"]),
+        anim("4", "Blå Puls", ["blå", "puls"]),
+        anim("5", "Ild", ["fire"]),
+    ]:
+        idx.add(a)
+    return idx
+
+
+def test_normalization_folds_danish_letters():
+    assert normalize_text("Bølge") == "bolge"
+    assert normalize_text("ÆBLE Blå") == "aeble bla"
+    assert tokenize("Regnbue-Fade 2") == ["regnbue", "fade", "2"]
+
+
+@pytest.mark.parametrize("query", ["bolge", "bølge", "BØLGE", "boelge"])
+def test_normalized_and_transliterated_queries_match(index, query):
+    assert names(index.search(query)) == ["Bølge"]
+
+
+def test_prefix(index):
+    assert names(index.search("hjer")) == ["Hjerteslag"]
+
+
+def test_typo(index):
+    assert names(index.search("hjertslag")) == ["Hjerteslag"]
+
+
+def test_tags_are_searchable(index):
+    assert names(index.search("farver")) == ["Regnbue Fade"]
+
+
+def test_all_query_tokens_must_match(index):
+    assert names(index.search("bla puls")) == ["Blå Puls"]
+    assert index.search("bla hjerteslag") == ([], 0)
+
+
+def test_remove(index):
+    index.remove("1")
+    assert index.search("bolge") == ([], 0)
+    assert len(index) == 4
+    index.remove("1")  # removing twice is a no-op
+
+
+def test_re_adding_replaces_document(index):
+    index.add(anim("1", "Spiral", ["motion"]))
+    assert index.search("bolge") == ([], 0)
+    assert names(index.search("spiral")) == ["Spiral"]
+
+
+def test_name_hits_rank_above_tag_hits_then_recency():
+    idx = AnimationSearchIndex()
+    idx.add(anim("tag", "Glimmer", ["fire"], age=0))
+    idx.add(anim("old", "Fire Old", age=5))
+    idx.add(anim("new", "Fire New", age=1))
+    idx.add(anim("prefix", "Fireworks", age=0))
+    assert names(idx.search("fire")) == ["Fire New", "Fire Old", "Glimmer", "Fireworks"]
+
+
+def test_pagination_and_total():
+    idx = AnimationSearchIndex()
+    for i in range(30):
+        idx.add(anim(str(i), f"Puls {i}", age=i))
+    items, total = idx.search("puls", limit=5, offset=10)
+    assert total == 30
+    assert [a.id for a in items] == ["10", "11", "12", "13", "14"]
+
+
+def test_multi_token_ranking_and_tag_filter(index):
+    index.add(anim("6", "Puls Fade", ["fade"], age=3))
+    items, total = index.search("puls fade")
+    assert total == 1 and items[0].id == "6"
+    items, total = index.search("fade", tags=["farver"])
+    assert total == 1 and items[0].id == "3"
+
+
+def test_matches_returns_every_hit(index):
+    assert {a.id for a in index.matches("fade")} == {"3"}
+    assert index.matches("") == []
+
+
+def test_tag_ids_and_counts(index):
+    index.add(anim("6", "Puls Fade", ["fade", "puls"]))
+    assert index.tag_ids(["fade"]) == {"3", "6"}
+    assert index.tag_ids(["fade", "puls"]) == {"6"}
+    assert index.tag_ids(["nope"]) == set()
+    assert index.tag_counts(index.tag_ids(["fade"])) == {"fade": 2, "farver": 1, "puls": 1}
+    assert index.tag_counts(index.match_ids("puls")) == {"blå": 1, "puls": 2, "fade": 1}
@@ -0,0 +1,106 @@
+import io
+import json
+from array import array
+
+import pytest
+
+import frame_format
+from frame_format import FrameFormatError, decode, encode, read_json_frames
+
+PARSERS = ["json"] + (["ijson"] if frame_format.ijson is not None else [])
+
+
+@pytest.fixture(params=PARSERS)
+def parser(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(frame_format, "ijson", None)
+    return request.param
+
+
+def read(doc):
+    raw = doc if isinstance(doc, bytes) else json.dumps(doc).encode()
+    return read_json_frames(io.BytesIO(raw))
+
+
+def rgb(colors):
+    return b"".join(c.to_bytes(3, "big") for c in colors)
+
+
+def animation(width, height, frame_count, colors):
+    frames = []
+    for i in range(frame_count):
+        pixels = array("I", (colors[(p * 7 + i) % len(colors)] for p in range(width * height)))
+        frames.append((40 + i, pixels))
+    return frames
+
+
+@pytest.mark.parametrize("color_count, bpp", [(2, 4), (16, 4), (17, 8), (256, 8), (257, 24)])
+def test_round_trip(color_count, bpp):
+    colors = [(i * 2654435761) & 0xFFFFFF for i in range(color_count)]
+    width, height = 23, 13  # odd pixel count exercises 4 bpp padding
+    frames = animation(width, height, 3, colors)
+    anim = decode(encode(width, height, frames))
+    assert (anim.bpp, anim.width, anim.height, anim.frame_count) == (bpp, width, height, 3)
+    assert anim.delays == [40, 41, 42]
+    for i, (_, pixels) in enumerate(frames):
+        assert anim.frame_rgb(i) == rgb(pixels)
+
+
+def test_read_accepts_all_colour_notations(parser):
+    doc = {"width": 3, "height": 1, "frames": [{"delay": 50, "pixels": ["#ff0000", [0, 255, 0], 255]}]}
+    width, height, frames = read(doc)
+    assert (width, height) == (3, 1)
+    assert frames[0][0] == 50
+    assert list(frames[0][1]) == [0xFF0000, 0x00FF00, 0x0000FF]
+
+
+def test_read_defaults_missing_delay(parser):
+    _, _, frames = read({"width": 1, "height": 1, "frames": [{"pixels": [0]}]})
+    assert frames[0][0] == frame_format.DEFAULT_DELAY
+
+
+def test_json_to_nvf_round_trip(parser):
+    doc = {"width": 2, "height": 2, "frames": [
+        {"delay": 100, "pixels": ["#000000", "#ffffff", "#ff0000", "#000000"]},
+        {"delay": 200, "pixels": ["#ffffff", "#000000", "#000000", "#ff0000"]},
+    ]}
+    anim = decode(encode(*read(doc)))
+    assert anim.delays == [100, 200]
+    assert anim.frame_rgb(1) == rgb([0xFFFFFF, 0, 0, 0xFF0000])
+
+
+@pytest.mark.parametrize("doc", [
+    b"{bad",
+    {"height": 1, "frames": [{"pixels": [0]}]},
+    {"width": 2.7, "height": 1, "frames": [{"pixels": [0, 0]}]},
+    {"width": True, "height": 1, "frames": [{"pixels": [0]}]},
+    {"width": "1", "height": 1, "frames": [{"pixels": [0]}]},
+    {"width": 0, "height": 1, "frames": [{"pixels": []}]},
+    {"width": 2000, "height": 1, "frames": [{"pixels": [0]}]},
+    {"width": 1, "height": 1, "frames": []},
+    {"width": 2, "height": 1, "frames": [{"pixels": [0]}]},
+    {"width": 1, "height": 1, "frames": [{"delay": "abc", "pixels": [0]}]},
+    {"width": 1, "height": 1, "frames": [{"delay": -1, "pixels": [0]}]},
+    {"width": 1, "height": 1, "frames": [{"delay": 1.5, "pixels": [0]}]},
+    {"width": 1, "height": 1, "frames": [{"delay": None, "pixels": [0]}]},
+    {"width": 1, "height": 1, "frames": [{"pixels": ["#fff"]}]},
+    {"width": 1, "height": 1, "frames": [{"pixels": [[1, 2, 300]]}]},
+    {"width": 1, "height": 1, "frames": [{"pixels": [[1, 2]]}]},
+    {"width": 1, "height": 1, "frames": [{"pixels": [None]}]},
+    {"width": 1, "height": 1, "frames": [{"pixels": [0x1000000]}]},
+])
+def test_read_rejects_invalid_input(parser, doc):
+    with pytest.raises(FrameFormatError):
+        read(doc)
+
+
+@pytest.mark.parametrize("data", [b"", b"NVF1", b"XXXX" + bytes(12)])
+def test_decode_rejects_invalid_header(data):
+    with pytest.raises(FrameFormatError):
+        decode(data)
+
+
+def test_decode_rejects_truncated_pixels():
+    data = encode(4, 4, animation(4, 4, 2, [0, 0xFFFFFF]))
+    with pytest.raises(FrameFormatError):
+        decode(data[:-1])
@@ -0,0 +1,66 @@
+import pytest
+
+from frame_store import FrameStore, FrameStoreError
+
+
+def frames(count, width=2, height=2):
+    return [(bytes([i]) * (width * height * 3), 100 + i) for i in range(count)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FrameStore(tmp_path, max_open=2, max_bytes=10 * 12)
+
+
+def test_write_read_and_index(store):
+    assert store.write("a", 2, 2, frames(3)) == 3
+    index = store.index("a")
+    assert (index["count"], index["stride"], index["delays"]) == (3, 12, [100, 101, 102])
+    assert store.read("a", 1, 2) == bytes([1]) * 12 + bytes([2]) * 12
+    assert store.index("missing") is None
+
+
+def test_rewrite_invalidates_cache(store):
+    store.write("a", 2, 2, frames(2))
+    before = store.index("a")["version"]
+    assert store.read("a", 0, 0) == bytes([0]) * 12
+    store.write("a", 2, 2, [(b"\x09" * 12, 50)])
+    index = store.index("a")
+    assert index["version"] != before
+    assert index["count"] == 1
+    assert store.read("a", 0, 0) == b"\x09" * 12
+
+
+@pytest.mark.parametrize("bad", [
+    frames(2) + [(b"\x00" * 5, 100)],  # stride mismatch partway through
+    frames(11),  # over max_bytes
+])
+def test_failed_write_leaves_no_partial_files(store, tmp_path, bad):
+    store.write("a", 2, 2, frames(1))
+    with pytest.raises(FrameStoreError):
+        store.write("a", 2, 2, bad)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.json", "a.rgb"]
+    assert store.index("a")["count"] == 1
+
+
+def test_check_size(store):
+    store.check_size(2, 2, 10)
+    with pytest.raises(FrameStoreError):
+        store.check_size(2, 2, 11)
+
+
+def test_delete_removes_all_files(store, tmp_path):
+    store.write("a", 2, 2, frames(1))
+    store.index("a")
+    (tmp_path / "a.rgb.part").write_bytes(b"x")
+    store.delete("a")
+    assert list(tmp_path.iterdir()) == []
+    assert store.index("a") is None
+
+
+def test_open_mappings_are_bounded(store):
+    for anim_id in "abc":
+        store.write(anim_id, 2, 2, frames(1))
+        store.index(anim_id)
+    assert list(store._open) == ["b", "c"]
+    assert store.read("a", 0, 0) == bytes([0]) * 12